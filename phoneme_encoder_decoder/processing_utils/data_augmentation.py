@@ -93,6 +93,55 @@ def augment_time_jitter(x, prior, y, jitter_vals, win_len, fs, time_axis=1):
     return x_jittered, prior_jittered, y_jittered
 
 
+def mixup_pair_inds(labels):
+    """Gets index pairs of observations/trials combined via MixUp.
+
+    Each observation/trial is first paired with itself (original data),
+    followed by all combinations of observations/trials that share the same
+    label. This covers the same data as generated by augment_mixup() and allows
+    mixing to be done on the fly (e.g. in a tf.data pipeline).
+
+    Args:
+        labels (ndarray): Label data in original format (i.e. not one-hot
+            encoded).
+
+    Returns:
+        (ndarray, ndarray): Indices of first and second observation/trial of
+            each pair.
+    """
+    orig_inds = np.arange(len(labels))
+    pairs = [np.stack((orig_inds, orig_inds), axis=-1)]
+    for (_, dup_inds) in list_duplicates(labels):
+        pairs.append(numpy_combinations(np.array(dup_inds)))
+    pairs = np.concatenate(pairs)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def jitter_window_inds(n_time, jitter_vals, win_len, fs):
+    """Gets timepoint indices of the windows extracted by
+    augment_time_jitter() for each jitter value.
+
+    Args:
+        n_time (int): Number of timepoints in full data.
+        jitter_vals (array-like): value(s) to shift original data window by.
+        win_len (int): Length of time window in seconds.
+        fs (int): Sampling rate of data.
+
+    Returns:
+        ndarray: Timepoint indices of each jittered window. Shape =
+            (n_jitter, win_len * fs)
+    """
+    t_dur = n_time / fs  # duration of full data
+    t_range = np.array([-t_dur/2, t_dur/2])  # full data centered around 0
+    reg_win = np.array([-win_len/2, win_len/2])  # non-jittered window, [-a, a]
+    win_inds = []
+    for jitter in jitter_vals:
+        jitter_win = reg_win + jitter  # jittered window, [-a + j, a + j]
+        tw_inds = get_tw_inds(t_range, jitter_win, fs)
+        win_inds.append(correct_tw_inds(tw_inds, jitter_win, fs))
+    return np.array(win_inds)
+
+
 def mixup_data(x1, x2, prior1, prior2, y1, y2, alpha=1):
     """Applies MixUp to a single observation/trial.
 
@@ -5,9 +5,12 @@ Adapted from code by Kumar Duraivel
 """
 
 import os
+import h5py
 import numpy as np
 import scipy.io as sio
 
+HG_VARIABLE_NAMES = ['hgTrace', 'hgMap', 'phonSeqLabels']
+
 
 def load_subject_high_gamma(subject_id, sig_channel=False, zscore=False,
                             cluster=False, data_dir=None):
@@ -33,12 +36,25 @@ def load_subject_high_gamma_phoneme(subject_id, phons=[1, 2, 3],
     return subj_dict
 
 
-def load_mat_data(filename):
-    return sio.loadmat(filename)
+def load_mat_data(filename, variable_names=None):
+    return sio.loadmat(filename, variable_names=variable_names)
+
+
+def load_hdf5_mat_data(filename, variable_names):
+    # v7.3 mat files are HDF5, stored in column-major (Fortran) order, so
+    # axes are reversed to match the scipy.io.loadmat layout
+    with h5py.File(filename, 'r') as f:
+        return {name: f[name][()].transpose() for name in variable_names}
+
+
+def is_hdf5_mat_file(filename):
+    # v7.3 mat files start with a 512 byte MATLAB header (HDF5 user block), so
+    # the HDF5 signature is not at the start of the file
+    return h5py.is_hdf5(filename)
 
 
 def get_feature_data(mat_data, feature_name):
-    return np.squeeze(np.array(mat_data[feature_name]))
+    return np.squeeze(mat_data[feature_name])
 
 
 def process_mat_filename(subject_id, sig_channel, zscore, phon=None,
@@ -73,7 +89,11 @@ def process_mat_filename(subject_id, sig_channel, zscore, phon=None,
 
 def get_high_gamma_data(filename):
 
-    mat_data = load_mat_data(filename)
+    # only read the variables that are needed from the mat file
+    if is_hdf5_mat_file(filename):
+        mat_data = load_hdf5_mat_data(filename, HG_VARIABLE_NAMES)
+    else:
+        mat_data = load_mat_data(filename, variable_names=HG_VARIABLE_NAMES)
 
     # shape = trials x channel_x x channel_y x timepoints
     hg_trace = get_feature_data(mat_data, 'hgTrace')
@@ -6,7 +6,6 @@ Adapted from code by Kumar Duraivel
 """
 
 import numpy as np
-import tensorflow as tf
 from keras.utils import to_categorical
 
 
@@ -104,7 +103,17 @@ def DEPone_hot_decode_batch(encoded_batch):
 
 
 def one_hot_decode_batch(encoded_batch):
-    return np.ravel(np.argmax(encoded_batch, axis=-1))
+    """Decodes a batch of one-hot encoded sequences into a flat array of
+    integers with a single vectorized argmax over the output dimension.
+
+    Args:
+        encoded_batch (ndarray): Batch of one-hot encoded sequences.
+            (n_trials, sequence length, cardinality of output space)
+
+    Returns:
+        ndarray: Decoded integers. Shape = (n_trials * sequence length)
+    """
+    return np.argmax(encoded_batch, axis=-1).astype(np.int32).ravel()
     # return tf.reshape(tf.math.argmax(encoded_batch, -1), [-1])
 
 
@@ -182,22 +191,38 @@ def DEPseq2seq_predict_batch(inf_enc, inf_dec, source, n_steps, n_output,
 
 
 def seq2seq_predict_batch(inf_enc, inf_dec, source, n_steps, n_output):
+    """Predicts batch of sequences of outputs using inference encoder and
+    decoder models. All observations are decoded together, so the encoder is
+    run once and the decoder once per time step, regardless of batch size.
+    Agnostic to RNN models (LSTM or GRU) as long as inference decoder predict
+    methods return format is "output, (states)".
+
+    Args:
+        inf_enc (Functional): Inference encoder model.
+        inf_dec (Functional): Inference decoder model.
+        source (ndarray): Feature data for batch. First dimension must be batch
+            size. Shape must be compatible with input to inference encoder.
+        n_steps (int): Length of sequence to be predicted.
+        n_output (int): Cardinality of output space (number of output classes).
+
+    Returns:
+        ndarray: Batch of predicted sequence of output probabilities. Shape =
+            (n_trials, n_steps, n_output)
+    """
     batch_states = inf_enc.predict_on_batch(source)
-    if isinstance(batch_states, list):  # lstm tensor conversion
-        batch_states = [tf.convert_to_tensor(s) for s in batch_states]
-    else:  # gru tensor conversion
-        batch_states = [tf.convert_to_tensor(batch_states)]
+    if not isinstance(batch_states, list):
+        batch_states = [batch_states]  # convert to list for gru compatibility
 
-    batch_target = tf.Variable(tf.zeros((source.shape[0], 1, n_output)))
-    batch_target = batch_target[:, 0, 0].assign(1)
-    # batch_target[:, 0, 0] = 1
+    # generate initial sequence (one-hot encoding corresponding to 0)
+    batch_target = np.zeros((source.shape[0], 1, n_output), dtype=np.float32)
+    batch_target[:, 0, 0] = 1
 
-    output = tf.Variable(tf.zeros((source.shape[0], n_steps, n_output)))
+    output = np.empty((source.shape[0], n_steps, n_output), dtype=np.float32)
     for step in range(n_steps):
         pred_data = inf_dec.predict_on_batch([batch_target] + batch_states)
-        batch_target = tf.convert_to_tensor(pred_data[0])
-        output = output[:, step, :].assign(tf.squeeze(batch_target))
-        batch_states = [tf.convert_to_tensor(s) for s in pred_data[1:]]
+        batch_target = pred_data[0]
+        output[:, step, :] = batch_target[:, 0, :]
+        batch_states = list(pred_data[1:])
 
     return output
 
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from processing_utils.data_augmentation import (augment_mixup,
+                                                augment_time_jitter,
+                                                jitter_window_inds,
+                                                mixup_pair_inds)
+
+
+FS = 10
+WIN_LEN = 1
+JITTER_VALS = np.linspace(-0.5, 0.5, 5)
+DUP_LABELS = np.array([[1, 2, 3], [1, 2, 3], [4, 5, 6], [1, 2, 3], [4, 5, 6],
+                       [7, 8, 9]])
+UNIQUE_LABELS = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+
+def make_batch(labels, n_time=20, n_chan=4, n_output=10):
+    rng = np.random.default_rng(0)
+    x = rng.random((len(labels), n_time, n_chan))
+    prior = rng.random((len(labels), labels.shape[1], n_output))
+    y = rng.random((len(labels), labels.shape[1], n_output))
+    return x, prior, y
+
+
+def mix_pairs(data, ind1, ind2, lam):
+    return lam * data[ind1] + (1 - lam) * data[ind2]
+
+
+@pytest.fixture
+def fixed_beta(monkeypatch):
+    lam = 0.3
+    monkeypatch.setattr(np.random, 'beta', lambda a, b: lam)
+    return lam
+
+
+def test_mixup_pair_inds_match_augment_mixup(fixed_beta):
+    x, prior, y = make_batch(DUP_LABELS)
+    ind1, ind2 = mixup_pair_inds(DUP_LABELS)
+    # original observations are paired with themselves
+    np.testing.assert_array_equal(ind1[:len(x)], np.arange(len(x)))
+    np.testing.assert_array_equal(ind2[:len(x)], np.arange(len(x)))
+
+    for data, aug in zip((x, prior, y),
+                         augment_mixup(x, prior, y, DUP_LABELS)):
+        np.testing.assert_allclose(mix_pairs(data, ind1, ind2, fixed_beta),
+                                   aug)
+
+
+def test_mixup_pair_inds_no_duplicates(fixed_beta):
+    x, prior, y = make_batch(UNIQUE_LABELS)
+    ind1, ind2 = mixup_pair_inds(UNIQUE_LABELS)
+    np.testing.assert_array_equal(ind1, np.arange(len(x)))
+    np.testing.assert_array_equal(ind2, np.arange(len(x)))
+
+    for data, aug in zip((x, prior, y),
+                         augment_mixup(x, prior, y, UNIQUE_LABELS)):
+        np.testing.assert_allclose(mix_pairs(data, ind1, ind2, fixed_beta),
+                                   aug)
+
+
+def test_jitter_window_inds_match_augment_time_jitter():
+    x, prior, y = make_batch(DUP_LABELS)
+    win_inds = jitter_window_inds(x.shape[1], JITTER_VALS, WIN_LEN, FS)
+    assert win_inds.shape == (len(JITTER_VALS), WIN_LEN * FS)
+
+    x_jit, prior_jit, y_jit = augment_time_jitter(x, prior, y, JITTER_VALS,
+                                                  WIN_LEN, FS)
+    # output is ordered by jitter value, then observation
+    np.testing.assert_array_equal(
+        np.concatenate([x[:, inds] for inds in win_inds]), x_jit)
+    np.testing.assert_array_equal(np.vstack([prior] * len(win_inds)),
+                                  prior_jit)
+    np.testing.assert_array_equal(np.vstack([y] * len(win_inds)), y_jit)
+
+
+def test_mixup_then_jitter(fixed_beta):
+    x, prior, y = make_batch(DUP_LABELS)
+    ind1, ind2 = mixup_pair_inds(DUP_LABELS)
+    win_inds = jitter_window_inds(x.shape[1], JITTER_VALS, WIN_LEN, FS)
+
+    x_aug, _, _ = augment_time_jitter(*augment_mixup(x, prior, y,
+                                                     DUP_LABELS),
+                                      JITTER_VALS, WIN_LEN, FS)
+    x_mixed = mix_pairs(x, ind1, ind2, fixed_beta)
+    np.testing.assert_allclose(
+        np.concatenate([x_mixed[:, inds] for inds in win_inds]), x_aug)
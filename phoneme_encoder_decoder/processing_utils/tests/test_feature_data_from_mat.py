@@ -0,0 +1,66 @@
+import h5py
+import numpy as np
+import scipy.io as sio
+
+from processing_utils.feature_data_from_mat import (get_high_gamma_data,
+                                                    is_hdf5_mat_file)
+
+
+MAT_HEADER = b'MATLAB 7.3 MAT-file, Platform: GLNXA64, Created on: test HDF5'
+
+
+def make_hg_data():
+    rng = np.random.default_rng(0)
+    hg_trace = rng.random((4, 20, 3))
+    hg_map = rng.random((4, 2, 5, 20))
+    phon_labels = rng.integers(1, 10, size=(4, 3)).astype(float)
+    return hg_trace, hg_map, phon_labels
+
+
+def write_v73_mat(filename, data):
+    # MATLAB writes arrays in column-major order with a 512 byte header
+    with h5py.File(filename, 'w', userblock_size=512) as f:
+        for name, arr in data.items():
+            f[name] = arr.transpose()
+    with open(filename, 'r+b') as f:
+        f.write(MAT_HEADER.ljust(512, b' '))
+
+
+def test_is_hdf5_mat_file_with_header(tmp_path):
+    filename = str(tmp_path / 'v73.mat')
+    write_v73_mat(filename, {'hgTrace': np.zeros((2, 3))})
+    with open(filename, 'rb') as f:
+        assert f.read(len(MAT_HEADER)) == MAT_HEADER
+    assert is_hdf5_mat_file(filename)
+
+
+def test_is_hdf5_mat_file_v5(tmp_path):
+    filename = str(tmp_path / 'v5.mat')
+    sio.savemat(filename, {'hgTrace': np.zeros((2, 3))})
+    assert not is_hdf5_mat_file(filename)
+
+
+def test_get_high_gamma_data_v73(tmp_path):
+    hg_trace, hg_map, phon_labels = make_hg_data()
+    filename = str(tmp_path / 'v73.mat')
+    write_v73_mat(filename, {'hgTrace': hg_trace, 'hgMap': hg_map,
+                             'phonSeqLabels': phon_labels,
+                             'unused': np.zeros(3)})
+
+    out_trace, out_map, out_labels = get_high_gamma_data(filename)
+    np.testing.assert_array_equal(out_trace, hg_trace)
+    np.testing.assert_array_equal(out_map, hg_map)
+    np.testing.assert_array_equal(out_labels, phon_labels)
+
+
+def test_get_high_gamma_data_v5(tmp_path):
+    hg_trace, hg_map, phon_labels = make_hg_data()
+    filename = str(tmp_path / 'v5.mat')
+    sio.savemat(filename, {'hgTrace': hg_trace, 'hgMap': hg_map,
+                           'phonSeqLabels': phon_labels,
+                           'unused': np.zeros(3)})
+
+    out_trace, out_map, out_labels = get_high_gamma_data(filename)
+    np.testing.assert_array_equal(out_trace, hg_trace)
+    np.testing.assert_array_equal(out_map, hg_map)
+    np.testing.assert_array_equal(out_labels, phon_labels)
@@ -6,6 +6,8 @@ import os
 import sys
 import argparse
 import numpy as np
+import tensorflow as tf
+from keras import mixed_precision
 from keras.optimizers import Adam
 from sklearn.metrics import balanced_accuracy_score, confusion_matrix
 from sklearn.model_selection import ShuffleSplit
@@ -21,7 +23,8 @@ from processing_utils.data_augmentation import (augment_mixup,
                                                 augment_time_jitter)
 from seq2seq_models.rnn_models import (stacked_lstm_1Dcnn_model,
                                        stacked_gru_1Dcnn_model)
-from train.train import train_seq2seq_kfold, train_seq2seq
+from train.train import (train_seq2seq_kfold, train_seq2seq,
+                         reinitialize_weights)
 from visualization.plot_model_performance import plot_loss_acc
 
 
@@ -57,6 +60,21 @@ def init_parser():
                         help='Generate synthetic trial data via time window'
                              'jittering (True) or use only original data'
                              '(False)')
+    parser.add_argument('-mp', '--mixed_precision', type=str, default='False',
+                        required=False,
+                        help='Train with mixed float16 precision (True) or '
+                             'full float32 precision (False). Speedup needs a '
+                             'GPU with tensor cores (Volta or newer)')
+    parser.add_argument('-x', '--xla', type=str, default='False',
+                        required=False,
+                        help='JIT-compile training steps with XLA (True) or'
+                             'run without XLA (False). XLA cannot compile the'
+                             'cuDNN RNN kernels, so RNN layers fall back to'
+                             'the slower generic implementation under XLA')
+    parser.add_argument('-g', '--multi_gpu', type=str, default='False',
+                        required=False,
+                        help='Train data-parallel across all visible GPUs'
+                             '(True) or on a single device (False)')
     return parser
 
 
@@ -83,6 +101,16 @@ def train_rnn():
     mixup_ext = '_mixup' if mixup else ''
     jitter = str2bool(inputs['jitter'])
     jitter_ext = '_jitter' if jitter else ''
+    mixed_prec = str2bool(inputs['mixed_precision'])
+    mixed_prec_ext = '_fp16' if mixed_prec else ''
+    xla = str2bool(inputs['xla'])
+    multi_gpu = str2bool(inputs['multi_gpu'])
+
+    if mixed_prec:
+        # float16 compute with float32 variables, compile() wraps the optimizer
+        # in a LossScaleOptimizer. float16 (not bfloat16) keeps the cuDNN RNN
+        # kernels on tensorflow<2.11. Must be set before any models are built
+        mixed_precision.set_global_policy('mixed_float16')
 
     if cluster:
         HOME_PATH = os.path.expanduser('~')
@@ -112,6 +140,10 @@ def train_rnn():
     X = hg_trace  # use HG traces (n_trials, n_channels, n_timepoints) for CNN
     X_prior, y, _, seq_labels = pad_sequence_teacher_forcing(phon_labels,
                                                              n_output)
+    # cast once to contiguous float32 so data is not converted every fold
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    X_prior = np.ascontiguousarray(X_prior, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float32)
 
     # Model parameters
     win_len = 1  # 1 second decoding window
@@ -187,35 +219,39 @@ def train_rnn():
             acc_filename = DATA_PATH + ('outputs/'
                                         f'{pt}{norm_ext}_acc_'
                                         f'{num_folds}fold{mixup_ext}'
-                                        f'{jitter_ext}.pkl')
+                                        f'{jitter_ext}{mixed_prec_ext}.pkl')
             plot_filename = DATA_PATH + ('outputs/'
                                          f'{pt}{norm_ext}'
                                          f'{num_folds}fold{mixup_ext}'
-                                         f'{jitter_ext}_train_%d.png')
+                                         f'{jitter_ext}{mixed_prec_ext}'
+                                         '_train_%d.png')
         else:
             acc_filename = DATA_PATH + ('outputs/'
                                         f'{pt}{norm_ext}_acc_'
                                         f'{test_size}-heldout{mixup_ext}'
-                                        f'{jitter_ext}.pkl')
+                                        f'{jitter_ext}{mixed_prec_ext}.pkl')
             plot_filename = DATA_PATH + ('outputs/'
                                          f'{pt}{norm_ext}'
                                          f'{test_size}-heldout{mixup_ext}'
-                                         f'{jitter_ext}_train_%d.png')
+                                         f'{jitter_ext}{mixed_prec_ext}'
+                                         '_train_%d.png')
 
     param_keys = ['model_type', 'filter_size', 'n_filters', 'n_units',
                   'n_layers', 'reg_lambda', 'dropout', 'bidir', 'mixup_alpha',
                   'num_folds', 'num_reps', 'epochs', 'learning_rate',
-                  'kfold_rand_state']
+                  'kfold_rand_state', 'mixed_precision', 'xla', 'multi_gpu']
     param_vals = [model_type, filter_size, n_filters, n_units, n_layers,
                   reg_lambda, dropout, bidir, mixup_alpha, num_folds, num_reps,
-                  epochs, learning_rate, kfold_rand_state]
+                  epochs, learning_rate, kfold_rand_state, mixed_prec, xla,
+                  multi_gpu]
     save_pkl_params(acc_filename, dict_from_lists(param_keys, param_vals))
 
-    for i in range(n_iter):
-        print('==============================================================')
-        print('Iteration: ', i+1)
-        print('==============================================================')
+    # mirror model variables across GPUs, batches are split between replicas
+    strategy = (tf.distribute.MirroredStrategy() if multi_gpu else
+                tf.distribute.get_strategy())
 
+    # build model once and re-initialize weights for later iterations
+    with strategy.scope():
         train_model, inf_enc, inf_dec = model_fcn(n_input_time,
                                                   n_input_channel,
                                                   n_output,
@@ -227,9 +263,21 @@ def train_rnn():
                                                   bidir=bidir,
                                                   dropout=dropout)
 
-        train_model.compile(optimizer=Adam(learning_rate),
-                            loss='categorical_crossentropy',
-                            metrics=['accuracy'])
+    for i in range(n_iter):
+        print('==============================================================')
+        print('Iteration: ', i+1)
+        print('==============================================================')
+
+        # new random weights for each iteration (also resets associated
+        # inference weights)
+        if i > 0:
+            reinitialize_weights(train_model)
+
+        # recompile for a fresh optimizer state
+        with strategy.scope():
+            train_model.compile(optimizer=Adam(learning_rate),
+                                loss='categorical_crossentropy',
+                                metrics=['accuracy'], jit_compile=xla)
 
         if kfold:
             k_hist, y_pred_all, y_test_all = train_seq2seq_kfold(
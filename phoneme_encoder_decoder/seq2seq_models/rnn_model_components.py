@@ -18,6 +18,16 @@ GRU_TRAINING_NAME = 'training_gru_initial'
 GRU_INF_ENC_NAME = 'inf_enc_gru_initial'
 GRU_INF_DEC_NAME = 'inf_dec_gru'
 
+# NOTE: LSTM and GRU layers are left at the default activation='tanh',
+# recurrent_activation='sigmoid', use_bias=True, recurrent_dropout=0,
+# unroll=False (and reset_after=True for GRU) so that Keras runs them with the
+# fused cuDNN kernel on GPU. Changing any of these (for either direction of a
+# Bidirectional layer) falls back to the much slower generic implementation.
+# Input dropout and L2 kernel/recurrent/bias regularizers do not affect this.
+# The cuDNN kernel supports float32 and float16 (mixed_float16 policy), but is
+# not registered for bfloat16 on tensorflow<2.11, so mixed_bfloat16 also falls
+# back to the generic implementation.
+
 
 def linear_cnn_1D_module(n_input_time, n_input_channel, n_filters, filter_size,
                          reg_lambda):
@@ -96,7 +106,8 @@ def lstm_enc_dec_module(encoder_inputs, n_output, n_units, reg_lambda,
                         bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _, _ = decoder_lstm(decoder_inputs,
                                          initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -155,7 +166,8 @@ def gru_enc_dec_module(encoder_inputs, n_output, n_units, reg_lambda,
                       bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _ = decoder_gru(decoder_inputs,
                                      initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -216,7 +228,8 @@ def bi_lstm_enc_dec_module(encoder_inputs, n_output, n_units, reg_lambda,
                         bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _, _ = decoder_lstm(decoder_inputs,
                                          initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -277,7 +290,8 @@ def bi_gru_enc_dec_module(encoder_inputs, n_output, n_units, reg_lambda,
                       bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _ = decoder_gru(decoder_inputs,
                                      initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -332,7 +346,8 @@ def multi_layer_lstm_enc_dec_module(encoder_inputs, n_output, n_layers,
                         bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _, _ = decoder_lstm(decoder_inputs,
                                          initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -392,7 +407,8 @@ def multi_layer_bi_lstm_enc_dec_module(encoder_inputs, n_output, n_layers,
                         bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _, _ = decoder_lstm(decoder_inputs,
                                          initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -449,7 +465,8 @@ def multi_layer_gru_enc_dec_module(encoder_inputs, n_output, n_layers,
                       bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _ = decoder_gru(decoder_inputs,
                                      initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -505,7 +522,8 @@ def multi_layer_bi_gru_enc_dec_module(encoder_inputs, n_output, n_layers,
                       bias_regularizer=L2(reg_lambda), dropout=dropout)
     decoder_outputs, _ = decoder_gru(decoder_inputs,
                                      initial_state=encoder_states)
-    decoder_dense = Dense(n_output, activation='softmax')
+    # softmax output kept in float32 for stability under mixed precision
+    decoder_dense = Dense(n_output, activation='softmax', dtype='float32')
     decoder_outputs = decoder_dense(decoder_outputs)
 
     # combine encoder and decoder into training model
@@ -5,6 +5,8 @@ Author: Zac Spalding
 Adapted from code by Kumar Duraivel
 """
 
+import numbers
+
 import numpy as np
 import tensorflow as tf
 from sklearn.model_selection import KFold
@@ -12,10 +14,14 @@ from keras.callbacks import EarlyStopping
 
 
 from processing_utils.sequence_processing import decode_seq2seq
-from processing_utils.data_augmentation import (augment_mixup,
-                                                augment_time_jitter)
+from processing_utils.data_augmentation import (augment_time_jitter,
+                                                mixup_pair_inds,
+                                                jitter_window_inds)
 from .Seq2seqPredictCallback import Seq2seqPredictCallback
 
+# shared generator so state is kept across calls to shuffle_weights
+_RNG = np.random.default_rng()
+
 
 def shuffle_weights(model, weights=None, layer_idx=None):
     """Randomly permute the weights in `model`, or the given `weights`.
@@ -43,7 +49,9 @@ def shuffle_weights(model, weights=None, layer_idx=None):
         else:
             weights = model.layers[layer_idx].get_weights()
 
-    weights = [np.random.permutation(w.flat).reshape(w.shape) for w in weights]
+    # permuted() shuffles the flattened weights and keeps the original shape,
+    # avoiding an intermediate copy from materializing w.flat
+    weights = [_RNG.permuted(w, axis=None) for w in weights]
     # Faster, but less random: only permutes along the first dimension
     # weights = [np.random.permutation(w) for w in weights]
 
@@ -53,17 +61,55 @@ def shuffle_weights(model, weights=None, layer_idx=None):
         model.layers[layer_idx].set_weights(weights)
 
 
+def reinitialize_weights(model):
+    """Re-initializes the weights of `model` in place by re-running the
+    initializers of each layer (including layers of nested models, wrapped
+    layers, and RNN cells). Unlike shuffle_weights(), this preserves the
+    structure of initializations such as orthogonal recurrent kernels and the
+    unit forget gate bias of LSTMs.
+
+    Args:
+        model (Model): Model whose weights will be re-initialized.
+    """
+    for module in model.submodules:
+        for var_name, init_name in (('kernel', 'kernel_initializer'),
+                                    ('recurrent_kernel',
+                                     'recurrent_initializer'),
+                                    ('bias', 'bias_initializer')):
+            var = getattr(module, var_name, None)
+            initializer = getattr(module, init_name, None)
+            if not hasattr(var, 'assign') or initializer is None:
+                continue
+            # fresh instance so unseeded initializers draw new values
+            initializer = type(initializer).from_config(
+                                                initializer.get_config())
+            if var_name == 'bias' and getattr(module, 'unit_forget_bias',
+                                              False):
+                # LSTM forget gate bias initialized to ones (gate order is
+                # input, forget, cell, output)
+                units = module.units
+                value = tf.concat([initializer((units,), dtype=var.dtype),
+                                   tf.ones((units,), dtype=var.dtype),
+                                   initializer((units * 2,), dtype=var.dtype)],
+                                  axis=0)
+            else:
+                value = initializer(var.shape, dtype=var.dtype)
+            var.assign(value)
+
+
 def train_seq2seq_kfold(train_model, inf_enc, inf_dec, X, X_prior, y,
-                        num_folds=10, num_reps=3, epochs=800,
-                        early_stop=False, rand_state=None,
+                        num_folds=10, num_reps=3, batch_size=200,
+                        epochs=800, early_stop=False, rand_state=None,
                         mixup_dict=None, jitter_dict=None, **kwargs):
     """Trains a seq2seq encoder-decoder model using k-fold cross validation.
 
     Uses k-fold cross validation to train a seq2seq encoder-decoder
     model. Each fold is repeated multiple times for stability in predictions.
-    Requires a training model, as well as inference encoder and decoder
-    for predicting sequences. Model is trained with teacher forcing from padded
-    versions of the target sequences.
+    Model weights are re-initialized for each repetition, and every fold of a
+    repetition starts from that repetition's initial weights. Requires a
+    training model, as well as inference encoder and decoder for predicting
+    sequences. Model is trained with teacher forcing from padded versions of
+    the target sequences.
 
     Args:
         train_model (Functional): Full encoder-decoder model for training.
@@ -77,31 +123,49 @@ def train_seq2seq_kfold(train_model, inf_enc, inf_dec, X, X_prior, y,
         y (ndarray): Labels. First dimension should be number of observations.
             Final dimension should be length of output sequence.
         num_folds (int, optional): Number of CV folds. Defaults to 10.
-        batch_size (int, optional): Training batch size. Defaults to 32.
+        batch_size (int, optional): Training batch size. Defaults to 200.
         epochs (int, optional): Number of training epochs. Defaults to 800.
         early_stop (bool, optional): Whether to stop training early based on
             validation loss performance. Defaults to True.
 
     Returns:
-        (Dict, ndarray, ndarray): Dictionary containing trained models
-            by fold, dictionary containing training performance history for
-            each fold, predicted labels across folds, and true labels across
-            folds.
+        (Dict, ndarray, ndarray): Dictionary containing training
+            performance history for each fold, predicted labels across folds,
+            and true labels across folds. Labels are flat int32 arrays of
+            length num_reps * n_observations * sequence length, ready to be
+            passed to sklearn metrics without conversion.
+            Each history is an array of shape (num_reps * num_folds, epochs)
+            with rows ordered by repetition, then fold, for every metric logged
+            during training. Folds stopped early repeat their final value for
+            the remaining epochs. Rows of folds that did not log a metric are
+            NaN.
             Dictionary structure is:
-            histories = {'accuracy': [fold1rep1_acc, ..., fold1repn_acc,
-                                      fold2rep1_acc, ...],
-                          'loss': [fold1rep1_loss, ..., fold1repn_loss,
-                                   fold2rep1_loss, ...],
-                          'val_accuracy': [fold1rep1_acc, ..., fold1repn_acc,
-                                           fold2rep1_acc, ...],
-                          'val_loss': [fold1rep1_loss, ..., fold1repn_loss,
-                                       fold2rep1_loss, ...],}
+            histories = {'accuracy': [rep1fold1_acc, ..., rep1foldk_acc,
+                                      rep2fold1_acc, ...],
+                          'loss': [rep1fold1_loss, ..., rep1foldk_loss,
+                                   rep2fold1_loss, ...],
+                          'val_accuracy': [rep1fold1_acc, ..., rep1foldk_acc,
+                                           rep2fold1_acc, ...],
+                          'val_loss': [rep1fold1_loss, ..., rep1foldk_loss,
+                                       rep2fold1_loss, ...],
+                          'seq2seq_val_accuracy': [...],
+                          'seq2seq_val_loss': [...]}
     """
-    # save initial weights to reset model for each fold
-    init_train_w = train_model.get_weights()
-
     # define k-fold cross validation
     cv = KFold(n_splits=num_folds, shuffle=True, random_state=rand_state)
+    # splits seeded with an int are identical every repetition, so only
+    # generate them once (a RandomState instance advances between calls)
+    folds = (list(cv.split(X)) if isinstance(rand_state, numbers.Integral)
+             else None)
+
+    # fold sizes differ by at most one observation, so buffers sized for the
+    # largest train/test split are reused (through views) by every fold
+    n_obs = X.shape[0]
+    n_test_max = -(-n_obs // num_folds)
+    n_train_max = n_obs - n_obs // num_folds
+    fold_bufs = [(np.empty((n_train_max,) + d.shape[1:], dtype=d.dtype),
+                  np.empty((n_test_max,) + d.shape[1:], dtype=d.dtype))
+                 for d in (X, X_prior, y)]
 
     cb = None
     # create callback for early stopping
@@ -113,41 +177,60 @@ def train_seq2seq_kfold(train_model, inf_enc, inf_dec, X, X_prior, y,
                            restore_best_weights=True)
         cb = [es]
 
-    # dictionary for history of each fold
-    histories = {'accuracy': [], 'loss': []}
-
-    y_pred_all, y_test_all = [], []
+    # history of each fold, arrays with one row per repetition and fold are
+    # allocated when each metric is first logged
+    histories = {}
+    hist_shape = (num_reps * num_folds, epochs)
+
+    # every observation is tested once per repetition, so total number of
+    # decoded labels is known ahead of time
+    n_total = X.shape[0] * num_reps * y.shape[1]
+    y_pred_all = np.empty(n_total, dtype=np.int32)
+    y_test_all = np.empty(n_total, dtype=np.int32)
+    cursor = 0
     for r in range(num_reps):  # repeat fold for stability
         print(f'======== Repetition {r + 1} ========')
 
+        # new initialization for each repetition (first repetition uses the
+        # weights of the provided model), saved to reset model for each fold
+        if r > 0:
+            reinitialize_weights(train_model)
+        init_train_w = train_model.get_weights()
+
         # cv training
-        for f, (train_ind, test_ind) in enumerate(cv.split(X)):
+        rep_folds = folds if folds is not None else cv.split(X)
+        for f, (train_ind, test_ind) in enumerate(rep_folds):
             print(f'===== Fold {f + 1} =====')
 
-            # reset model weights for current fold (also resets associated
-            # inference weights)
-            shuffle_weights(train_model, weights=init_train_w)
+            # reset model to repetition's initial weights for current fold
+            # (also resets associated inference weights)
+            train_model.set_weights(init_train_w)
 
             history, y_pred_fold, y_test_fold = train_seq2seq_single_fold(
                                         train_model, inf_enc, inf_dec, X,
                                         X_prior, y, train_ind, test_ind,
+                                        batch_size=batch_size,
                                         epochs=epochs, callbacks=cb,
                                         mixup_dict=mixup_dict,
                                         jitter_dict=jitter_dict,
-                                        **kwargs)
+                                        fold_bufs=fold_bufs, **kwargs)
 
-            y_pred_all.extend(y_pred_fold)
-            y_test_all.extend(y_test_fold)
+            n_fold = len(y_pred_fold)
+            y_pred_all[cursor:cursor + n_fold] = y_pred_fold
+            y_test_all[cursor:cursor + n_fold] = y_test_fold
+            cursor += n_fold
 
-            track_model_history(histories, history)  # track history in-place
+            # track history in-place
+            track_model_history(histories, history, row=r * num_folds + f,
+                                shape=hist_shape)
 
-    return histories, np.array(y_pred_all), np.array(y_test_all)
+    return histories, y_pred_all, y_test_all
 
 
 def train_seq2seq_single_fold(train_model, inf_enc, inf_dec, X, X_prior, y,
-                              train_ind, test_ind, epochs=800,
-                              callbacks=None, mixup_dict=None,
-                              jitter_dict=None, **kwargs):
+                              train_ind, test_ind, batch_size=200,
+                              epochs=800, callbacks=None, mixup_dict=None,
+                              jitter_dict=None, fold_bufs=None, **kwargs):
     """Implements single fold of cross-validation for seq2seq models.
 
     Args:
@@ -167,30 +250,33 @@ def train_seq2seq_single_fold(train_model, inf_enc, inf_dec, X, X_prior, y,
             method of sklearn cross-validation objects.
         batch_size (int, optional): Training batch size. Defaults to 200.
         epochs (int, optional): Number of training epochs. Defaults to 800.
+        mixup_dict (Dict, optional): MixUp parameters with keys 'alpha' and
+            'labels' (labels for all observations). Defaults to None.
+        jitter_dict (Dict, optional): Time jitter parameters with keys
+            'jitter_vals', 'win_len', and 'fs'. Defaults to None.
+        fold_bufs (list, optional): Preallocated (train, test) buffer pairs
+            for `X`, `X_prior`, and `y` to gather fold data into. First
+            dimension of each buffer must be at least the size of the
+            corresponding split. If None, new arrays are allocated. Defaults
+            to None.
 
     Returns:
         (Callback, ndarray, ndarray): Model training history, predicted labels,
             and true labels.
     """
-    X_train, X_test = X[train_ind], X[test_ind]
-    X_prior_train, X_prior_test = X_prior[train_ind], X_prior[test_ind]
-    y_train, y_test = y[train_ind], y[test_ind]
-
+    if fold_bufs is None:
+        fold_bufs = [None] * 3
+    X_train, X_test = _split_fold(X, train_ind, test_ind, fold_bufs[0])
+    X_prior_train, X_prior_test = _split_fold(X_prior, train_ind, test_ind,
+                                              fold_bufs[1])
+    y_train, y_test = _split_fold(y, train_ind, test_ind, fold_bufs[2])
+
+    # training data is augmented every epoch in the input pipeline
     if mixup_dict is not None:
-        mixup_alpha = mixup_dict['alpha']
-        labels_train = (mixup_dict['labels'])[train_ind]
-        X_train, X_prior_train, y_train = augment_mixup(X_train,
-                                                        X_prior_train,
-                                                        y_train,
-                                                        labels_train,
-                                                        alpha=mixup_alpha)
+        mixup_dict = {'alpha': mixup_dict['alpha'],
+                      'labels': (mixup_dict['labels'])[train_ind]}
 
     if jitter_dict is not None:
-        X_train, X_prior_train, y_train = augment_time_jitter(
-                                            X_train, X_prior_train, y_train,
-                                            jitter_dict['jitter_vals'],
-                                            jitter_dict['win_len'],
-                                            jitter_dict['fs'])
         # use jitter value of 0 to clip proper window from test data
         X_test, X_prior_test, y_test = augment_time_jitter(
                                             X_test, X_prior_test, y_test,
@@ -199,12 +285,14 @@ def train_seq2seq_single_fold(train_model, inf_enc, inf_dec, X, X_prior, y,
 
     seq2seq_cb = Seq2seqPredictCallback(train_model, inf_enc, inf_dec,
                                         X_test, y_test)
+    # copy callbacks so prediction callbacks from previous folds are not kept
     if callbacks is not None:
-        callbacks.append(seq2seq_cb)
+        callbacks = callbacks + [seq2seq_cb]
     else:
         callbacks = [seq2seq_cb]
     _, history = train_seq2seq(train_model, X_train, X_prior_train, y_train,
-                               batch_size=X_train.shape[0], epochs=epochs,
+                               batch_size=batch_size, epochs=epochs,
+                               mixup_dict=mixup_dict, jitter_dict=jitter_dict,
                                validation_data=([X_test, X_prior_test],
                                                 y_test),
                                callbacks=callbacks, **kwargs)
@@ -215,7 +303,34 @@ def train_seq2seq_single_fold(train_model, inf_enc, inf_dec, X, X_prior, y,
     return history, y_test_fold, y_pred_fold
 
 
-def train_seq2seq(model, X, X_prior, y, batch_size=200, epochs=800, **kwargs):
+def _split_fold(data, train_ind, test_ind, bufs=None):
+    """Gathers train and test data of a fold, optionally into preallocated
+    buffers.
+
+    Args:
+        data (ndarray): Data to split. First dimension should be number of
+            observations.
+        train_ind (ndarray): Indices of training data.
+        test_ind (ndarray): Indices of test data.
+        bufs ((ndarray, ndarray), optional): Train and test buffers to gather
+            data into. Defaults to None.
+
+    Returns:
+        (ndarray, ndarray): Train and test data.
+    """
+    if bufs is None:
+        return data[train_ind], data[test_ind]
+    train_buf, test_buf = bufs
+    # mode='raise' makes numpy gather into a temporary before copying to out,
+    # CV indices are always in range so 'clip' lets it write out directly
+    return (np.take(data, train_ind, axis=0, out=train_buf[:len(train_ind)],
+                    mode='clip'),
+            np.take(data, test_ind, axis=0, out=test_buf[:len(test_ind)],
+                    mode='clip'))
+
+
+def train_seq2seq(model, X, X_prior, y, batch_size=200, epochs=800,
+                  mixup_dict=None, jitter_dict=None, **kwargs):
     """Trains a seq2seq encoder-decoder model.
 
     Trains a seq2seq encoder-decoder model. Model is trained with teacher
@@ -232,26 +347,171 @@ def train_seq2seq(model, X, X_prior, y, batch_size=200, epochs=800, **kwargs):
             Final dimension should be length of output sequence.
         batch_size (int, optional): Training batch size. Defaults to 32.
         epochs (int, optional): Number of training epochs. Defaults to 800.
-        early_stop (bool, optional): Whether to stop training early based on
-            validation loss performance. Defaults to True.
+        mixup_dict (Dict, optional): MixUp parameters with keys 'alpha' and
+            'labels'. If given, training data is augmented via MixUp every
+            epoch. Defaults to None.
+        jitter_dict (Dict, optional): Time jitter parameters with keys
+            'jitter_vals', 'win_len', and 'fs'. If given, training data is
+            augmented via time jittering every epoch. Defaults to None.
 
     Returns:
         (Functional, Callback): Trained model, training performance history.
     """
-    history = model.fit([X, X_prior], y, batch_size=batch_size,
+    if mixup_dict is not None or jitter_dict is not None:
+        train_ds = _make_augmented_dataset(X, X_prior, y, batch_size,
+                                           mixup_dict=mixup_dict,
+                                           jitter_dict=jitter_dict)
+    else:
+        train_ds = _make_dataset(X, X_prior, y, batch_size, shuffle=True)
+
+    # wrap validation data in the same pipeline as the training data
+    validation_data = kwargs.pop('validation_data', None)
+    if validation_data is not None:
+        (X_val, X_prior_val), y_val = validation_data
+        validation_data = _make_dataset(X_val, X_prior_val, y_val, batch_size)
+
+    history = model.fit(train_ds, validation_data=validation_data,
                         epochs=epochs, **kwargs)
 
     return model, history
 
 
-def track_model_history(hist_dict, history):
+def _make_dataset(X, X_prior, y, batch_size, shuffle=False):
+    """Creates a prefetched dataset from in-memory training data.
+
+    Only observation indices are shuffled and batched, and each batch is
+    gathered from the data tensors, so the data is held in memory once instead
+    of again in a cache and shuffle buffer. Prefetching overlaps preparation of
+    the next batch with the current training step.
+
+    Args:
+        X (ndarray): Feature data. First dimension should be number of
+            observations.
+        X_prior (ndarray): Shifted labels for teacher forcing.
+        y (ndarray): Labels. First dimension should be number of observations.
+        batch_size (int): Batch size.
+        shuffle (bool, optional): Whether to reshuffle observations every
+            epoch. Defaults to False.
+
+    Returns:
+        Dataset: Batched dataset yielding ((X, X_prior), y) tuples.
+    """
+    n_obs = X.shape[0]
+    X, X_prior, y = (tf.convert_to_tensor(d) for d in (X, X_prior, y))
+
+    def gather_batch(inds):
+        x, prior, target = (tf.gather(d, inds) for d in (X, X_prior, y))
+        return (x, prior), target
+
+    # shuffle indices instead of data to keep the shuffle buffer small
+    dataset = tf.data.Dataset.range(n_obs)
+    if shuffle:
+        dataset = dataset.shuffle(n_obs, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(gather_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def _make_augmented_dataset(X, X_prior, y, batch_size, mixup_dict=None,
+                            jitter_dict=None):
+    """Creates a dataset that applies MixUp and/or time jittering on the fly.
+
+    The dataset covers the same observations as augment_mixup() followed by
+    augment_time_jitter(), but only indices of the augmented observations are
+    stored. Observations are generated in parallel while the model trains, with
+    a new MixUp coefficient drawn every epoch.
+
+    Args:
+        X (ndarray): Feature data. First dimension should be number of
+            observations.
+        X_prior (ndarray): Shifted labels for teacher forcing.
+        y (ndarray): Labels. First dimension should be number of observations.
+        batch_size (int): Batch size.
+        mixup_dict (Dict, optional): MixUp parameters with keys 'alpha' and
+            'labels'. Defaults to None.
+        jitter_dict (Dict, optional): Time jitter parameters with keys
+            'jitter_vals', 'win_len', and 'fs'. Defaults to None.
+
+    Returns:
+        Dataset: Shuffled and batched dataset yielding ((X, X_prior), y)
+            tuples.
+    """
+    alpha = 0
+    if mixup_dict is not None:
+        alpha = mixup_dict['alpha']
+        ind1, ind2 = mixup_pair_inds(mixup_dict['labels'])
+    else:
+        ind1 = ind2 = np.arange(X.shape[0])
+
+    jitter_inds = None
+    n_jitter = 1
+    if jitter_dict is not None:
+        jitter_inds = tf.convert_to_tensor(jitter_window_inds(
+                                                X.shape[1],
+                                                jitter_dict['jitter_vals'],
+                                                jitter_dict['win_len'],
+                                                jitter_dict['fs']))
+        n_jitter = jitter_inds.shape[0]
+
+    # every (mixup pair, jitter window) combination is one observation
+    n_pairs = len(ind1)
+    ind1, ind2 = np.tile(ind1, n_jitter), np.tile(ind2, n_jitter)
+    jitter_ind = np.repeat(np.arange(n_jitter), n_pairs)
+
+    X, X_prior, y = (tf.convert_to_tensor(d) for d in (X, X_prior, y))
+
+    def augment(i1, i2, j):
+        x = tf.gather(X, i1)
+        prior = tf.gather(X_prior, i1)
+        target = tf.gather(y, i1)
+        if alpha > 0:
+            # beta distributed coefficient from ratio of gamma samples
+            g1 = tf.random.gamma([], alpha)
+            g2 = tf.random.gamma([], alpha)
+            # observations paired with themselves are original data
+            lam = tf.where(tf.equal(i1, i2), 1.0, g1 / (g1 + g2))
+
+            def mix(v, data):
+                v_lam = tf.cast(lam, data.dtype)
+                return v_lam * v + (1 - v_lam) * tf.gather(data, i2)
+
+            x, prior, target = mix(x, X), mix(prior, X_prior), mix(target, y)
+        if jitter_inds is not None:
+            x = tf.gather(x, jitter_inds[j], axis=0)
+        return (x, prior), target
+
+    # shuffle indices instead of data to keep the shuffle buffer small
+    dataset = tf.data.Dataset.from_tensor_slices((ind1, ind2, jitter_ind))
+    dataset = dataset.shuffle(len(ind1), reshuffle_each_iteration=True)
+    dataset = dataset.map(augment, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def track_model_history(hist_dict, history, row=None, shape=None):
     """Appends model training history to a dictionary in place.
 
     Args:
         hist_dict (Dict): Dictionary to append history to.
         history (Callback): Model training history from keras model fit method.
+        row (int, optional): Row of preallocated history arrays in `hist_dict`
+            to write history to. Epochs not run (e.g. due to early stopping)
+            are filled with the final value. If None, history is appended to
+            lists instead. Defaults to None.
+        shape (tuple(int), optional): Shape (rows, epochs) of history arrays
+            allocated for metrics not yet in `hist_dict` when writing to
+            `row`. Required if `row` is given. Defaults to None.
     """
+    if row is not None and shape is None:
+        raise ValueError('shape must be given when writing history to a row.')
+
     for key in history.history.keys():
-        if key not in hist_dict.keys():
-            hist_dict[key] = []
-        hist_dict[key].append(history.history[key])
+        if row is not None:
+            if key not in hist_dict.keys():
+                hist_dict[key] = np.full(shape, np.nan, dtype=np.float32)
+            key_hist = history.history[key]
+            hist_dict[key][row, :len(key_hist)] = key_hist
+            hist_dict[key][row, len(key_hist):] = key_hist[-1]
+        else:
+            if key not in hist_dict.keys():
+                hist_dict[key] = []
+            hist_dict[key].append(history.history[key])
@@ -60,6 +60,8 @@ def extend_history_lists(histories, epochs=100):
 
     # extend histories to specified length
     for key in histories.keys():
+        if isinstance(histories[key], np.ndarray):
+            continue  # preallocated histories already span all epochs
         for fold in range(len(histories[key])):
             if extend_on_end:
                 ext_list = extend_list_to_length(histories[key][fold], epochs)